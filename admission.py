@@ -0,0 +1,215 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = 1
+
+RATE_PER_MINUTE = float(os.environ.get("ADMISSION_RATE_PER_MINUTE", 6))
+BURST = float(os.environ.get("ADMISSION_BURST", 5))
+OVERFLOW = float(os.environ.get("ADMISSION_OVERFLOW", 5))
+GEMINI_MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", 8))
+MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", 100))
+SIGNUP_REPLY_INTERVAL = float(os.environ.get("SIGNUP_REPLY_INTERVAL", 600))
+MAX_PENDING_UNVERIFIED = int(os.environ.get("ADMISSION_MAX_PENDING_UNVERIFIED", 50))
+KNOWN_SENDER_TTL = float(os.environ.get("KNOWN_SENDER_TTL", 600))
+UNKNOWN_SENDER_TTL = float(os.environ.get("UNKNOWN_SENDER_TTL", 5))
+MAX_TRACKED_NUMBERS = 10000
+
+def _prune_idle(entries: dict, is_idle):
+    """Drops idle per-number entries once MAX_TRACKED_NUMBERS are being tracked."""
+    if len(entries) < MAX_TRACKED_NUMBERS:
+        return
+    for key in [k for k, v in entries.items() if is_idle(v)]:
+        del entries[key]
+
+class TokenBucket:
+    """A token bucket refilled continuously at `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def is_full(self):
+        self.refill()
+        return self.tokens >= self.burst
+
+    def consume(self, floor: float = 0):
+        """
+        Takes one token if that leaves at least `floor` and returns whether it did.
+        A negative floor lets the bucket borrow against future refills.
+        """
+        self.refill()
+        if self.tokens - 1 >= floor:
+            self.tokens -= 1
+            return True
+        return False
+
+class AdmissionController:
+    """
+    Decides which inbound messages reach Gemini, and in what order.
+    Every sender gets a token bucket: messages within the rate run at normal priority, up to `overflow` more run at
+    low priority, and anything beyond that is shed until the bucket refills.
+    At most `max_concurrency` Gemini calls run at once; the rest wait in a priority queue of `max_queue` entries,
+    and when it is full the lowest-priority message is shed.
+    All methods must be called from the same event loop.
+    """
+
+    def __init__(self, rate_per_minute=RATE_PER_MINUTE, burst=BURST, overflow=OVERFLOW, max_concurrency=GEMINI_MAX_CONCURRENCY,
+                 max_queue=MAX_QUEUE, signup_reply_interval=SIGNUP_REPLY_INTERVAL):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.overflow = overflow
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.signup_reply_interval = signup_reply_interval
+
+        self._buckets = {}
+        self._unregistered = {}
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.rejected_unregistered = 0
+
+    def reject_unregistered(self, phone_number: str):
+        """
+        Counts a message from an unknown number and returns whether it should get the sign-up reply.
+        Only the reply is throttled, to once per `signup_reply_interval`; the caller still looks the number up
+        every time, so someone who has just registered is served straight away.
+        """
+        self.rejected_unregistered += 1
+        now = time.monotonic()
+        replied_at = self._unregistered.get(phone_number)
+        if replied_at is not None and now - replied_at < self.signup_reply_interval:
+            return False
+        _prune_idle(self._unregistered, lambda replied_at: now - replied_at >= self.signup_reply_interval)
+        self._unregistered[phone_number] = now
+        return True
+
+    def priority_for(self, phone_number: str):
+        """
+        Charges the sender's token bucket and returns the priority their message should run at,
+        or None (counted as shed) if the sender is over both their rate and their overflow allowance.
+        """
+        bucket = self._buckets.get(phone_number)
+        if bucket is None:
+            _prune_idle(self._buckets, TokenBucket.is_full)
+            bucket = self._buckets[phone_number] = TokenBucket(self.rate, self.burst)
+        if not bucket.consume(floor=-self.overflow):
+            self.shed += 1
+            return None
+        return PRIORITY_NORMAL if bucket.tokens >= 0 else PRIORITY_LOW
+
+    async def acquire(self, priority: int):
+        """Waits for a Gemini slot. Returns False if the message was shed instead."""
+        if self._in_flight < self.max_concurrency and not self._live_waiters():
+            self._in_flight += 1
+            self.admitted += 1
+            return True
+
+        if self._live_waiters() >= self.max_queue:
+            worst = max((w for w in self._waiters if not w[2].done()), default=None)
+            if worst is None or worst[0] <= priority:
+                self.shed += 1
+                return False
+            self._waiters.remove(worst)
+            heapq.heapify(self._waiters)
+            worst[2].set_result(False)
+            self.shed += 1
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self.queued += 1
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.result():
+                self.release()
+            raise
+
+    def release(self):
+        """Frees a Gemini slot, handing it straight to the best queued message if there is one."""
+        self._in_flight -= 1
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._in_flight += 1
+                self.admitted += 1
+                future.set_result(True)
+                break
+
+    def stats(self):
+        """Returns the counters. Call it on the controller's event loop, like every other method."""
+        return {
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+            "rejected_unregistered": self.rejected_unregistered,
+            "in_flight": self._in_flight,
+            "queue_depth": self._live_waiters(),
+        }
+
+    def _live_waiters(self):
+        return sum(1 for w in self._waiters if not w[2].done())
+
+class SenderDirectory:
+    """
+    Remembers which numbers recently looked up as registered or unknown, so the webhook can sort messages
+    before queueing them. Unlike AdmissionController it is thread-safe, since request threads read it.
+    Unknown results are only kept for a few seconds, so someone who has just signed up is not turned away.
+    """
+
+    def __init__(self, known_ttl=KNOWN_SENDER_TTL, unknown_ttl=UNKNOWN_SENDER_TTL):
+        self.known_ttl = known_ttl
+        self.unknown_ttl = unknown_ttl
+        self._lock = threading.Lock()
+        self._known = {}
+        self._unknown = {}
+        self.dropped_unknown = 0
+
+    def mark_known(self, phone_number: str):
+        with self._lock:
+            self._unknown.pop(phone_number, None)
+            _prune_idle(self._known, lambda seen_at: time.monotonic() - seen_at >= self.known_ttl)
+            self._known[phone_number] = time.monotonic()
+
+    def mark_unknown(self, phone_number: str):
+        with self._lock:
+            self._known.pop(phone_number, None)
+            _prune_idle(self._unknown, lambda seen_at: time.monotonic() - seen_at >= self.unknown_ttl)
+            self._unknown[phone_number] = time.monotonic()
+
+    def is_known(self, phone_number: str):
+        with self._lock:
+            seen_at = self._known.get(phone_number)
+            return seen_at is not None and time.monotonic() - seen_at < self.known_ttl
+
+    def drop_if_unknown(self, phone_number: str):
+        """True (and counted) if this number looked up as unknown moments ago, so its message can be dropped."""
+        with self._lock:
+            seen_at = self._unknown.get(phone_number)
+            if seen_at is not None and time.monotonic() - seen_at < self.unknown_ttl:
+                self.dropped_unknown += 1
+                return True
+            return False
+
+    def stats(self):
+        with self._lock:
+            return {"dropped_unknown": self.dropped_unknown}
+
+admission = AdmissionController()
+senders = SenderDirectory()
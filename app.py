@@ -4,42 +4,139 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
+import hmac
 import json
+import asyncio
 import traceback
 from flask import (
     Flask, request, abort, render_template, 
-    redirect, session, url_for, flash
+    redirect, session, url_for, flash, jsonify
 )
 from google_auth_oauthlib.flow import Flow
 from datetime import datetime, timedelta, timezone
 from functools import wraps
 
 from core_logic import (
-    send_whatsapp_message, 
-    call_gemini_api, 
-    create_notion_page, 
-    get_google_service_from_token, 
-    create_google_calendar_event
+    submit_background,
+    get_background_loop,
+    send_whatsapp_message_async,
+    call_gemini_api_async,
+    create_notion_page_async,
+    get_google_access_token_async,
+    create_google_calendar_event_async
 )
 
+from admission import admission, senders, MAX_PENDING_UNVERIFIED
+from capture import capture_payload
+
 from supabase_helpers import (
     supabase,
     sign_up_with_email,
     sign_in_with_email,
-    get_user_by_phone,
     get_profile_by_user_id,
     create_profile_if_not_exists,
     save_phone_number,
     save_user_notion_details,
     save_user_google_token,
-    add_scheduled_event
+    get_user_by_phone_async,
+    add_scheduled_event_async
 )
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY")
 VERIFY_TOKEN = os.environ.get("META_VERIFY_TOKEN")
+ADMIN_STATS_TOKEN = os.environ.get("ADMIN_STATS_TOKEN")
 GOOGLE_CREDS_FILE = 'credentials.json'
 
+async def handle_incoming_message(from_number: str, message_body: str):
+    """Parses one inbound WhatsApp message and syncs it, running on the background event loop."""
+    try:
+        user_profile = await get_user_by_phone_async(from_number)
+        if not user_profile:
+            senders.mark_unknown(from_number)
+            if admission.reject_unregistered(from_number):
+                await send_whatsapp_message_async(from_number, "Hi! I don't recognize your number. Please sign up at https://bettim.tech/ to use this service.")
+            return
+        senders.mark_known(from_number)
+
+        priority = admission.priority_for(from_number)
+        if priority is None or not await admission.acquire(priority):
+            await send_whatsapp_message_async(from_number, "Sorry, I'm handling a lot of messages right now. Please resend that in a few minutes.")
+            return
+        try:
+            event_data = await call_gemini_api_async(message_body)
+        finally:
+            admission.release()
+
+        if not event_data:
+            await send_whatsapp_message_async(from_number, "Sorry, I had a problem understanding that. Please try again.")
+            return
+
+        title = event_data.get('title')
+
+        deadline_str = event_data.get('deadline_utc')
+
+        if not title or not deadline_str:
+            await send_whatsapp_message_async(from_number, "Sorry, I understood the event but couldn't find a clear title or deadline. Please try again.")
+            return
+
+        priority = event_data.get('priority', 'medium')
+        reminder_message = ""
+
+        try:
+            deadline_utc = datetime.fromisoformat(deadline_str.replace('Z', '+00:00'))
+
+            ist_offset = timedelta(hours=5, minutes=30)
+            deadline_ist = deadline_utc + ist_offset
+
+            reminder_time_utc = deadline_utc - timedelta(hours=1)
+            now_utc = datetime.now(timezone.utc)
+            if reminder_time_utc > now_utc:
+                await add_scheduled_event_async(
+                    user_id=user_profile['id'],
+                    phone_number=from_number,
+                    title=title,
+                    deadline_utc=deadline_utc,
+                    reminder_time_utc=reminder_time_utc
+                )
+                reminder_message = "I'll send you a reminder 1 hour before it's due."
+            else:
+                reminder_message = "The 1-hour reminder time for this event is already in the past, so a reminder won't be sent."
+        except Exception as e:
+            print(f"Error parsing deadline or scheduling: {e}")
+            reminder_message = "Sorry, I couldn't parse the deadline to schedule a reminder."
+
+        sync_tasks = []
+        if (user_profile.get('sync_notion') and 
+            user_profile.get('notion_api_key') and 
+            user_profile.get('notion_database_id')):
+            sync_tasks.append(create_notion_page_async(user_profile['notion_api_key'], user_profile['notion_database_id'], title, deadline_str, priority))
+
+        if (user_profile.get('sync_calendar') and 
+            user_profile.get('google_refresh_token')):
+            sync_tasks.append(sync_google_calendar(user_profile['google_refresh_token'], title, deadline_str))
+
+        await asyncio.gather(*sync_tasks)
+
+        deadline_ist_str = deadline_ist.strftime('%Y-%m-%d %H:%M')
+
+        reply_message = (
+            f"✅ *Event Synced!*\n\n"
+            f"*Event:* {title}\n"
+            f"*Deadline (IST):* {deadline_ist_str}\n"
+            f"*Priority:* {priority.capitalize()}\n\n"
+            f"{reminder_message}"
+        )
+        await send_whatsapp_message_async(from_number, reply_message)
+
+    except Exception as e:
+        print(f"Error processing message: {e}")
+
+async def sync_google_calendar(refresh_token: str, title: str, deadline_str: str):
+    access_token = await get_google_access_token_async(refresh_token)
+    if access_token:
+        await create_google_calendar_event_async(access_token, title, deadline_str)
+
 @app.route("/whatsapp-webhook", methods=['GET', 'POST'])
 def webhook():
     if request.method == 'GET':
@@ -51,83 +148,28 @@ def webhook():
     elif request.method == 'POST':
         payload = request.get_json()
         print(f"Incoming payload: {payload}")
+        capture_payload(payload)
         try:
             if 'entry' in payload and payload['entry'][0]['changes'][0]['value'].get('messages'):
                 message_data = payload['entry'][0]['changes'][0]['value']['messages'][0]
                 from_number = message_data['from']
                 message_body = message_data['text']['body']
-                
-                user_profile = get_user_by_phone(from_number)
-                if not user_profile:
-                    send_whatsapp_message(from_number, "Hi! I don't recognize your number. Please sign up at https://bettim.tech/ to use this service.")
-                    return "OK", 200
-                
-                user_local_time = datetime.now().isoformat()
-                event_data = call_gemini_api(message_body)
-                
-                if not event_data:
-                    send_whatsapp_message(from_number, "Sorry, I had a problem understanding that. Please try again.")
-                    return "OK", 200
 
-                title = event_data.get('title')
-
-                deadline_str = event_data.get('deadline_utc')
-
-                if not title or not deadline_str:
-                    send_whatsapp_message(from_number, "Sorry, I understood the event but couldn't find a clear title or deadline. Please try again.")
+                if senders.drop_if_unknown(from_number):
                     return "OK", 200
 
-                priority = event_data.get('priority', 'medium')
-                will_send_reminder = False
-                reminder_message = ""
-
-                try:
-                    deadline_utc = datetime.fromisoformat(deadline_str.replace('Z', '+00:00'))
-
-                    ist_offset = timedelta(hours=5, minutes=30)
-                    deadline_ist = deadline_utc + ist_offset
-
-                    reminder_time_utc = deadline_utc - timedelta(hours=1)
-                    now_utc = datetime.now(timezone.utc)
-                    if reminder_time_utc > now_utc:
-                        will_send_reminder = True
-                        add_scheduled_event(
-                            user_id=user_profile['id'],
-                            phone_number=from_number,
-                            title=title,
-                            deadline_utc=deadline_utc,
-                            reminder_time_utc=reminder_time_utc
-                        )
-                        reminder_message = "I'll send you a reminder 1 hour before it's due."
-                    else:
-                        reminder_message = "The 1-hour reminder time for this event is already in the past, so a reminder won't be sent."
-                except Exception as e:
-                    print(f"Error parsing deadline or scheduling: {e}")
-                    reminder_message = "Sorry, I couldn't parse the deadline to schedule a reminder."
-
-                if (user_profile.get('sync_notion') and 
-                    user_profile.get('notion_api_key') and 
-                    user_profile.get('notion_database_id')):
-                    create_notion_page(user_profile['notion_api_key'], user_profile['notion_database_id'], title, deadline_str, priority)
-
-                if (user_profile.get('sync_calendar') and 
-                    user_profile.get('google_refresh_token')):
-                    service = get_google_service_from_token(user_profile['google_refresh_token'])
-                    if service:
-                        create_google_calendar_event(service, title, deadline_str)
-
-                deadline_ist_str = deadline_ist.strftime('%Y-%m-%d %H:%M')
-
-                reply_message = (
-                    f"✅ *Event Synced!*\n\n"
-                    f"*Event:* {title}\n"
-                    f"*Deadline (IST):* {deadline_ist_str}\n"
-                    f"*Priority:* {priority.capitalize()}\n\n"
-                    f"{reminder_message}"
-                )
-                send_whatsapp_message(from_number, reply_message)
-
-
+                # Meta only needs a fast 200; the network-bound work runs on the shared event loop.
+                # Numbers not yet seen as registered share a smaller pending budget, so a flood from
+                # unknown numbers cannot crowd out known users. When a budget is full, a 503 makes
+                # Meta retry the delivery later.
+                if senders.is_known(from_number):
+                    future = submit_background(handle_incoming_message(from_number, message_body))
+                else:
+                    future = submit_background(handle_incoming_message(from_number, message_body),
+                                               pool="unverified", pool_limit=MAX_PENDING_UNVERIFIED)
+                if not future:
+                    print(f"Too many pending messages, asking Meta to retry message from {from_number}")
+                    return "Busy", 503
 
         except Exception as e:
             print(f"Error processing message: {e}")
@@ -137,6 +179,21 @@ def webhook():
     else:
         abort(405)
 
+async def read_admission_stats():
+    return {**admission.stats(), **senders.stats()}
+
+def get_admission_stats():
+    """Reads the admission counters on the background loop that owns them."""
+    return asyncio.run_coroutine_threadsafe(read_admission_stats(), get_background_loop()).result(timeout=5)
+
+@app.route("/admission-stats")
+def admission_stats():
+    """Reports how many webhook messages were admitted, queued, shed or rejected. Requires ADMIN_STATS_TOKEN."""
+    expected = f"Bearer {ADMIN_STATS_TOKEN}"
+    if not ADMIN_STATS_TOKEN or not hmac.compare_digest(request.headers.get("Authorization", ""), expected):
+        abort(403)
+    return jsonify(get_admission_stats())
+
 def login_required(f):
     """A decorator to protect routes that require a login."""
     @wraps(f)
@@ -0,0 +1,90 @@
+import os
+import re
+import hmac
+import json
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+CAPTURE_FILE = os.environ.get("WEBHOOK_CAPTURE_FILE")
+CAPTURE_SALT = os.environ.get("WEBHOOK_CAPTURE_SALT")
+PHONE_KEYS = {"from", "wa_id", "recipient_id", "display_phone_number", "phone_number_id"}
+NAME_KEYS = {"name"}
+ID_KEYS = {"id"}
+TEXT_KEYS = {"body"}
+# A phone number in text is either international (+ then digits, optionally spaced or dashed) or a single
+# run of 10-15 digits. Separated digit groups without a + are left alone: those are dates and amounts.
+PHONE_IN_TEXT = re.compile(r"(?<![\w+])(?:\+\d[\d \-]{7,18}\d|\d{10,15})(?!\w)")
+
+_capture_lock = threading.Lock()
+_missing_salt_warned = False
+
+def pseudonymize_phone(phone_number: str, salt: str):
+    """
+    Maps a phone number to a stable fake one, so replayed traffic keeps per-sender patterns.
+    The mapping is keyed with `salt`; a plain hash of a phone number can be brute-forced.
+    """
+    digits = "".join(filter(str.isdigit, str(phone_number)))
+    digest = hmac.new(salt.encode(), digits.encode(), hashlib.sha256).hexdigest()
+    return "999" + str(int(digest, 16))[:9]
+
+def pseudonymize_id(message_id: str, salt: str):
+    """Replaces a message ID with a keyed hash, since Meta's `wamid.` IDs embed the sender's phone number."""
+    prefix = "wamid." if message_id.startswith("wamid.") else ""
+    return prefix + hmac.new(salt.encode(), message_id.encode(), hashlib.sha256).hexdigest()[:32]
+
+def _pseudonymize_phone_in_text(match, salt: str):
+    digits = "".join(filter(str.isdigit, match.group()))
+    if not 10 <= len(digits) <= 15:
+        return match.group()
+    return pseudonymize_phone(digits, salt)
+
+def sanitize_payload(value, salt: str):
+    """
+    Returns a copy of a webhook payload with phone numbers (including any in message text) and message IDs
+    pseudonymized, and profile names removed.
+    """
+    if isinstance(value, dict):
+        sanitized = {}
+        for key, item in value.items():
+            if key in PHONE_KEYS and isinstance(item, (str, int)):
+                sanitized[key] = pseudonymize_phone(item, salt)
+            elif key in NAME_KEYS and isinstance(item, str):
+                sanitized[key] = "redacted"
+            elif key in ID_KEYS and isinstance(item, str):
+                sanitized[key] = pseudonymize_id(item, salt)
+            elif key in TEXT_KEYS and isinstance(item, str):
+                sanitized[key] = PHONE_IN_TEXT.sub(lambda m: _pseudonymize_phone_in_text(m, salt), item)
+            else:
+                sanitized[key] = sanitize_payload(item, salt)
+        return sanitized
+    if isinstance(value, list):
+        return [sanitize_payload(item, salt) for item in value]
+    return value
+
+def capture_payload(payload, path: str = None, salt: str = None):
+    """
+    Appends a sanitized webhook payload to the capture file, if capturing is enabled.
+    Nothing is written unless WEBHOOK_CAPTURE_SALT (or `salt`) is set.
+    """
+    global _missing_salt_warned
+    path = path or CAPTURE_FILE
+    salt = salt or CAPTURE_SALT
+    if not path:
+        return
+    if not salt:
+        if not _missing_salt_warned:
+            print("WEBHOOK_CAPTURE_FILE is set but WEBHOOK_CAPTURE_SALT is not; webhook payloads will not be captured.")
+            _missing_salt_warned = True
+        return
+    try:
+        record = {
+            "received_at": datetime.now(timezone.utc).isoformat(),
+            "payload": sanitize_payload(payload, salt)
+        }
+        line = json.dumps(record, ensure_ascii=False)
+        with _capture_lock:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except Exception as e:
+        print(f"Error capturing webhook payload: {e}")
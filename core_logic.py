@@ -1,5 +1,12 @@
 import os
 import json
+import time
+import atexit
+import asyncio
+import threading
+import functools
+from collections import Counter
+import httpx
 import requests
 import google.generativeai as genai
 from notion_client import Client
@@ -8,6 +15,95 @@ from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 
+GEMINI_MODEL = 'gemini-2.5-flash'
+NOTION_VERSION = '2022-06-28'
+GOOGLE_TOKEN_URI = "https://oauth2.googleapis.com/token"
+MAX_PENDING_TASKS = int(os.environ.get("MAX_PENDING_TASKS", 500))
+SHUTDOWN_DRAIN_TIMEOUT = float(os.environ.get("SHUTDOWN_DRAIN_TIMEOUT", 20))
+
+_async_client = None
+_async_client_loop = None
+_background_loop = None
+_background_lock = threading.Lock()
+_pending_tasks = 0
+_pending_by_pool = Counter()
+_pending_lock = threading.Condition()
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Returns the httpx.AsyncClient shared by all async integrations.
+    A client is bound to the event loop it was created on, so a new one is made if the loop changes
+    and the old one is closed on its own loop, if that loop is still alive.
+    """
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        if _async_client is not None and _async_client_loop.is_running():
+            asyncio.run_coroutine_threadsafe(_async_client.aclose(), _async_client_loop)
+        _async_client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=50)
+        )
+        _async_client_loop = loop
+    return _async_client
+
+async def close_async_http_client():
+    """Closes the shared httpx.AsyncClient, if one is open."""
+    global _async_client, _async_client_loop
+    if _async_client is not None:
+        await _async_client.aclose()
+    _async_client = None
+    _async_client_loop = None
+
+def get_background_loop():
+    """Returns a long-lived event loop running in a daemon thread, starting it on first use."""
+    global _background_loop
+    with _background_lock:
+        if _background_loop is None or _background_loop.is_closed():
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="async-io", daemon=True).start()
+        return _background_loop
+
+def _background_task_done(pool, future):
+    global _pending_tasks
+    with _pending_lock:
+        _pending_tasks -= 1
+        if pool:
+            _pending_by_pool[pool] -= 1
+        _pending_lock.notify_all()
+
+def submit_background(coro, pool: str = None, pool_limit: int = None):
+    """
+    Schedules a coroutine on the background loop and returns its concurrent.futures.Future.
+    Returns None, without running the coroutine, if MAX_PENDING_TASKS are already pending,
+    or if `pool` is given and `pool_limit` of its tasks are already pending.
+    """
+    global _pending_tasks
+    with _pending_lock:
+        if _pending_tasks >= MAX_PENDING_TASKS or (pool and _pending_by_pool[pool] >= pool_limit):
+            coro.close()
+            return None
+        _pending_tasks += 1
+        if pool:
+            _pending_by_pool[pool] += 1
+    future = asyncio.run_coroutine_threadsafe(coro, get_background_loop())
+    future.add_done_callback(functools.partial(_background_task_done, pool))
+    return future
+
+def drain_background(timeout: float = SHUTDOWN_DRAIN_TIMEOUT):
+    """Waits up to `timeout` seconds for pending background tasks, logging any that are abandoned."""
+    deadline = time.monotonic() + timeout
+    with _pending_lock:
+        if _pending_tasks:
+            print(f"Draining {_pending_tasks} background tasks before exit...")
+        while _pending_tasks and time.monotonic() < deadline:
+            _pending_lock.wait(deadline - time.monotonic())
+        if _pending_tasks:
+            print(f"Exiting with {_pending_tasks} background tasks unfinished; those messages are lost.")
+
+atexit.register(drain_background)
+
 def send_whatsapp_message(to_number: str, text: str):
     """Sends a reply message using the Meta Graph API."""
     PHONE_NUMBER_ID = os.environ.get("META_PHONE_NUMBER_ID")
@@ -30,17 +126,37 @@ def send_whatsapp_message(to_number: str, text: str):
     except requests.exceptions.RequestException as e:
         print(f"Failed to send WhatsApp message: {e}")
 
-def call_gemini_api(text: str):
-    """Sends text to Gemini and gets structured JSON back."""
-    genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
-    model = genai.GenerativeModel('gemini-2.5-flash',
-                                  generation_config={"response_mime_type": "application/json"})
-    
+async def send_whatsapp_message_async(to_number: str, text: str):
+    """Async version of send_whatsapp_message on the shared httpx client."""
+    PHONE_NUMBER_ID = os.environ.get("META_PHONE_NUMBER_ID")
+    ACCESS_TOKEN = os.environ.get("META_ACCESS_TOKEN")
+
+    url = f"https://graph.facebook.com/v19.0/{PHONE_NUMBER_ID}/messages"
+    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
+
+    data = {
+        "messaging_product": "whatsapp",
+        "to": to_number,
+        "type": "text",
+        "text": {"body": text}
+    }
+
+    try:
+        response = await get_async_http_client().post(url, headers=headers, json=data)
+        response.raise_for_status()
+        print(f"WhatsApp message sent to {to_number}")
+        return True
+    except httpx.HTTPError as e:
+        print(f"Failed to send WhatsApp message: {e}")
+        return False
+
+def build_gemini_prompt(text: str):
+    """Builds the event-parsing prompt for Gemini, anchored to the current IST time."""
     ist_tz = timezone(timedelta(hours=5, minutes=30))
     current_time_ist = datetime.now(ist_tz)
     today_date_str = current_time_ist.strftime("%Y-%m-%d %H:%M:%S %Z")
 
-    prompt = f"""
+    return f"""
     You are an expert event parser. Your task is to extract a 'title', 'deadline_utc', and 'priority' from the user's text.
     You MUST respond ONLY with a JSON object.
 
@@ -86,6 +202,14 @@ def call_gemini_api(text: str):
     **User Text to Parse:**
     "{text}"
     """
+
+def call_gemini_api(text: str):
+    """Sends text to Gemini and gets structured JSON back."""
+    genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+    model = genai.GenerativeModel(GEMINI_MODEL,
+                                  generation_config={"response_mime_type": "application/json"})
+
+    prompt = build_gemini_prompt(text)
     try:
         response = model.generate_content(prompt)
         return json.loads(response.text)
@@ -93,6 +217,22 @@ def call_gemini_api(text: str):
         print(f"Gemini API error: {e}")
         return None
 
+async def call_gemini_api_async(text: str):
+    """Async version of call_gemini_api using the Gemini REST endpoint."""
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
+    headers = {"x-goog-api-key": os.environ.get("GEMINI_API_KEY", "")}
+    data = {
+        "contents": [{"parts": [{"text": build_gemini_prompt(text)}]}],
+        "generationConfig": {"responseMimeType": "application/json"}
+    }
+    try:
+        response = await get_async_http_client().post(url, headers=headers, json=data)
+        response.raise_for_status()
+        return json.loads(response.json()["candidates"][0]["content"]["parts"][0]["text"])
+    except Exception as e:
+        print(f"Gemini API error: {e}")
+        return None
+
 def create_notion_page(api_key: str, db_id: str, title: str, deadline: str, priority: str):
     """Creates a new page in a user's specific Notion database."""
     try:
@@ -113,6 +253,26 @@ def create_notion_page(api_key: str, db_id: str, title: str, deadline: str, prio
         print(f"Notion API error: {e}")
         return False
 
+async def create_notion_page_async(api_key: str, db_id: str, title: str, deadline: str, priority: str):
+    """Async version of create_notion_page on the shared httpx client."""
+    headers = {"Authorization": f"Bearer {api_key}", "Notion-Version": NOTION_VERSION}
+    new_page_data = {
+        "parent": {"database_id": db_id},
+        "properties": {
+            "Title": {"title": [{"text": {"content": title}}]},
+            "Deadline": {"date": {"start": deadline}},
+            "Priority": {"select": {"name": priority}}
+        }
+    }
+    try:
+        response = await get_async_http_client().post("https://api.notion.com/v1/pages", headers=headers, json=new_page_data)
+        response.raise_for_status()
+        print("Notion page created.")
+        return True
+    except Exception as e:
+        print(f"Notion API error: {e}")
+        return False
+
 def get_google_service_from_token(refresh_token: str):
     """
     Creates a Google Calendar service object from a user's refresh token.
@@ -125,7 +285,7 @@ def get_google_service_from_token(refresh_token: str):
         creds = Credentials(
             token=None,
             refresh_token=refresh_token,
-            token_uri="https://oauth2.googleapis.com/token",
+            token_uri=GOOGLE_TOKEN_URI,
             client_id=CLIENT_ID,
             client_secret=CLIENT_SECRET,
             scopes=['https://www.googleapis.com/auth/calendar.events']
@@ -139,6 +299,25 @@ def get_google_service_from_token(refresh_token: str):
         print(f"Error building Google service: {e}")
         return None
 
+async def get_google_access_token_async(refresh_token: str):
+    """
+    Exchanges a user's refresh token for a short-lived access token.
+    This is the async counterpart of get_google_service_from_token.
+    """
+    data = {
+        "grant_type": "refresh_token",
+        "refresh_token": refresh_token,
+        "client_id": os.environ.get("GOOGLE_CLIENT_ID"),
+        "client_secret": os.environ.get("GOOGLE_CLIENT_SECRET")
+    }
+    try:
+        response = await get_async_http_client().post(GOOGLE_TOKEN_URI, data=data)
+        response.raise_for_status()
+        return response.json()["access_token"]
+    except Exception as e:
+        print(f"Error refreshing Google token: {e}")
+        return None
+
 def create_google_calendar_event(service, title: str, deadline_utc: str):
     """Creates a new event in the user's Google Calendar."""
     try:
@@ -155,4 +334,27 @@ def create_google_calendar_event(service, title: str, deadline_utc: str):
         return True
     except Exception as e:
         print(f"Google Calendar API error: {e}")
-        return False
\ No newline at end of file
+        return False
+
+async def create_google_calendar_event_async(access_token: str, title: str, deadline_utc: str):
+    """Async version of create_google_calendar_event, authorized with an access token."""
+    try:
+        end_time = datetime.fromisoformat(deadline_utc.replace('Z', '+00:00'))
+        start_time = end_time - timedelta(hours=1)
+
+        event = {
+          'summary': title,
+          'start': {'dateTime': start_time.isoformat(), 'timeZone': 'UTC'},
+          'end': {'dateTime': end_time.isoformat(), 'timeZone': 'UTC'},
+        }
+        response = await get_async_http_client().post(
+            "https://www.googleapis.com/calendar/v3/calendars/primary/events",
+            headers={"Authorization": f"Bearer {access_token}"},
+            json=event
+        )
+        response.raise_for_status()
+        print("Google Calendar event created.")
+        return True
+    except Exception as e:
+        print(f"Google Calendar API error: {e}")
+        return False
@@ -0,0 +1,243 @@
+import os
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+
+# Stage name -> (app.py global it wraps, whether a falsy return counts as an error).
+STAGES = {
+    "lookup": ("get_user_by_phone_async", False),
+    "parse": ("call_gemini_api_async", True),
+    "schedule": ("add_scheduled_event_async", True),
+    "notion": ("create_notion_page_async", True),
+    "calendar_token": ("get_google_access_token_async", True),
+    "calendar": ("create_google_calendar_event_async", True),
+    "reply": ("send_whatsapp_message_async", True),
+    "handler": ("handle_incoming_message", False),
+}
+
+# Mean stub latency in seconds for each external call.
+STUB_LATENCY = {
+    "lookup": 0.03,
+    "parse": 0.8,
+    "schedule": 0.03,
+    "notion": 0.3,
+    "calendar_token": 0.1,
+    "calendar": 0.2,
+    "reply": 0.15,
+}
+
+STUB_PROFILE = {
+    "id": "replay-user",
+    "sync_notion": True,
+    "notion_api_key": "stub",
+    "notion_database_id": "stub",
+    "sync_calendar": True,
+    "google_refresh_token": "stub",
+}
+
+class StageStats:
+    """Thread-safe latency and error counters, keyed by stage."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+
+    def record(self, stage: str, seconds: float, error: str = None):
+        with self.lock:
+            self.latencies[stage].append(seconds)
+            if error:
+                self.errors[stage][error] += 1
+
+def load_payloads(path: str):
+    """Reads captured webhook payloads from a JSONL file written by capture.py."""
+    payloads = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            payloads.append(record.get("payload", record))
+    return payloads
+
+def arrival_times(count: int, rate: float, mode: str, burst_size: int, rng: random.Random):
+    """Returns send offsets in seconds for `count` requests averaging `rate` per second."""
+    if mode == "constant":
+        return [i / rate for i in range(count)]
+    if mode == "poisson":
+        times, t = [], 0.0
+        for _ in range(count):
+            times.append(t)
+            t += rng.expovariate(rate)
+        return times
+    if mode == "burst":
+        return [(i // burst_size) * burst_size / rate for i in range(count)]
+    raise ValueError(f"Unknown rate mode: {mode}")
+
+def percentile(values, pct: float):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def make_stub(stage: str, scale: float, rng: random.Random):
+    async def stub(*args, **kwargs):
+        await asyncio.sleep(STUB_LATENCY[stage] * scale * rng.uniform(0.5, 1.5))
+        if stage == "lookup":
+            return dict(STUB_PROFILE)
+        if stage == "parse":
+            deadline = datetime.now(timezone.utc) + timedelta(days=1)
+            return {"title": str(args[0])[:50], "deadline_utc": deadline.strftime("%Y-%m-%dT%H:%M:%SZ"), "priority": "medium"}
+        if stage == "calendar_token":
+            return "stub"
+        return True
+    return stub
+
+def make_timed(stats: StageStats, stage: str, func, falsy_is_error: bool):
+    async def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            stats.record(stage, time.perf_counter() - start, type(e).__name__)
+            raise
+        stats.record(stage, time.perf_counter() - start, "failed" if falsy_is_error and not result else None)
+        return result
+    return timed
+
+def instrument_app(app_module, stats: StageStats, stub: bool, stub_scale: float, rng: random.Random):
+    """Wraps the webhook's stage functions with timers (and stubs), and returns the list that collects handler futures."""
+    for stage, (name, falsy_is_error) in STAGES.items():
+        func = getattr(app_module, name)
+        if stub and stage in STUB_LATENCY:
+            func = make_stub(stage, stub_scale, rng)
+        setattr(app_module, name, make_timed(stats, stage, func, falsy_is_error))
+
+    futures = []
+    submit_background = app_module.submit_background
+    def collecting_submit(coro):
+        future = submit_background(coro)
+        if future:
+            futures.append(future)
+        return future
+    app_module.submit_background = collecting_submit
+    return futures
+
+def print_report(stats: StageStats, sent: int, send_seconds: float, total_seconds: float, admission_stats=None):
+    print(f"\nSent {sent} requests in {send_seconds:.2f}s ({sent / send_seconds if send_seconds else 0:.1f} req/s)")
+    handled = len(stats.latencies.get("handler", []))
+    if handled:
+        print(f"Handled {handled} messages in {total_seconds:.2f}s ({handled / total_seconds:.1f} msg/s)")
+
+    print(f"\n{'stage':<15}{'calls':>7}{'errors':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage in ["webhook"] + list(STAGES):
+        latencies = stats.latencies.get(stage)
+        if not latencies:
+            continue
+        errors = sum(stats.errors[stage].values())
+        row = [percentile(latencies, p) * 1000 for p in (50, 90, 99)] + [max(latencies) * 1000]
+        print(f"{stage:<15}{len(latencies):>7}{errors:>8}" + "".join(f"{v:>10.1f}" for v in row))
+
+    if any(stats.errors.values()):
+        print("\nErrors:")
+        for stage, counter in stats.errors.items():
+            for error, count in counter.most_common():
+                print(f"  {stage}: {error} x{count}")
+
+    if admission_stats:
+        print("\nAdmission: " + ", ".join(f"{k}={v}" for k, v in admission_stats.items()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured WhatsApp webhook payloads against the Flask app.")
+    parser.add_argument("file", help="JSONL file written with WEBHOOK_CAPTURE_FILE")
+    parser.add_argument("--rate", type=float, default=10.0, help="average requests per second (default: 10)")
+    parser.add_argument("--mode", choices=["constant", "poisson", "burst"], default="constant", help="arrival pattern")
+    parser.add_argument("--burst-size", type=int, default=20, help="requests per burst in burst mode (default: 20)")
+    parser.add_argument("--concurrency", type=int, default=16, help="webhook requests in flight at once (default: 16)")
+    parser.add_argument("--count", type=int, help="requests to send, cycling through the file (default: one pass)")
+    parser.add_argument("--url", help="POST to a running server instead of the in-process app; only webhook latency is reported")
+    parser.add_argument("--live", action="store_true", help="call the real Supabase, Gemini, Notion, Calendar and WhatsApp services "
+                        "instead of stubs that only add delays; sends real WhatsApp messages")
+    parser.add_argument("--stub-latency-scale", type=float, default=1.0, help="multiplier for stub latencies (default: 1.0)")
+    parser.add_argument("--drain-timeout", type=float, default=60.0, help="seconds to wait for background handlers (default: 60)")
+    parser.add_argument("--seed", type=int, help="random seed for poisson arrivals and stub latencies")
+    args = parser.parse_args()
+
+    if args.rate <= 0:
+        parser.error("--rate must be greater than 0")
+    if args.burst_size < 1:
+        parser.error("--burst-size must be at least 1")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.count is not None and args.count < 1:
+        parser.error("--count must be at least 1")
+    stub = not args.live
+
+    rng = random.Random(args.seed)
+    payloads = load_payloads(args.file)
+    if not payloads:
+        parser.error(f"No payloads found in {args.file}")
+    count = args.count or len(payloads)
+    offsets = arrival_times(count, args.rate, args.mode, args.burst_size, rng)
+
+    stats = StageStats()
+    futures = []
+    app_module = None
+    if args.url:
+        import httpx
+        http_client = httpx.Client(timeout=30.0)
+        def post(payload):
+            response = http_client.post(args.url, json=payload)
+            return response.status_code
+    else:
+        if stub:
+            os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+            os.environ.setdefault("SUPABASE_KEY", "stub")
+        import app as app_module
+        # Replayed traffic must not be appended back onto the capture file.
+        app_module.capture_payload = lambda payload: None
+        futures = instrument_app(app_module, stats, stub, args.stub_latency_scale, rng)
+        local = threading.local()
+        def post(payload):
+            if not hasattr(local, "client"):
+                local.client = app_module.app.test_client()
+            return local.client.post("/whatsapp-webhook", json=payload).status_code
+
+    def send(payload, scheduled_at):
+        try:
+            status = post(payload)
+            stats.record("webhook", time.perf_counter() - scheduled_at, None if status == 200 else f"HTTP {status}")
+        except Exception as e:
+            stats.record("webhook", time.perf_counter() - scheduled_at, type(e).__name__)
+
+    target = args.url or ("in-process app, live services" if args.live else "in-process app, stubbed services")
+    print(f"Replaying {count} requests from {args.file} to {target} ({args.mode}, {args.rate} req/s, concurrency {args.concurrency})...")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for i, offset in enumerate(offsets):
+            scheduled_at = start + offset
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, payloads[i % len(payloads)], scheduled_at)
+    send_seconds = time.perf_counter() - start
+
+    if futures:
+        done, pending = wait(futures, timeout=args.drain_timeout)
+        if pending:
+            print(f"{len(pending)} handlers still running after {args.drain_timeout}s")
+    total_seconds = time.perf_counter() - start
+
+    print_report(stats, count, send_seconds, total_seconds, app_module.get_admission_stats() if app_module else None)
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,66 @@
 import os
-import time
+import asyncio
 from datetime import datetime, timezone, timedelta
 from zoneinfo import ZoneInfo
 
 from dotenv import load_dotenv
 load_dotenv()
 
-from supabase_helpers import get_pending_reminders, mark_reminder_as_sent
-from core_logic import send_whatsapp_message
+from supabase_helpers import get_pending_reminders_async, mark_reminder_as_sent_async
+from core_logic import send_whatsapp_message_async, close_async_http_client
 
-SLEEP_INTERVAL = 60 
+SLEEP_INTERVAL = 60
+MAX_IN_FLIGHT = int(os.environ.get("SCHEDULER_MAX_IN_FLIGHT", 200))
 
-def run_scheduler():
-    print("Starting reminder scheduler...")
-    while True:
+async def send_reminder(reminder, semaphore):
+    async with semaphore:
         try:
-            now_utc = datetime.now(timezone.utc)
-            print(f"[{now_utc.isoformat()}] Checking for pending reminders...")
-            reminders = get_pending_reminders(now_utc)
-            
-            if not reminders:
-                print("No reminders due right now.")
-            else:
-                print(f"Found {len(reminders)} reminders to send!")
-            for reminder in reminders:
-                try:
-                    deadline_str = reminder['event_deadline_utc']
-                    deadline_utc = datetime.fromisoformat(deadline_str.replace('Z', '+00:00'))
-
-                    ist_tz = ZoneInfo("Asia/Kolkata")
-                    deadline_ist = deadline_utc.astimezone(ist_tz)
-                    deadline_ist_str = deadline_ist.strftime('%Y-%m-%d %H:%M')
-                    
-                    message = (
-                        f"🔔 *REMINDER* 🔔\n\n"
-                        f"This is a 1-hour reminder for your event:\n\n"
-                        f"*{reminder['event_title']}*\n\n"
-                        f"It's due at *{deadline_ist_str}* (IST)."
-                    )
-                    send_whatsapp_message(reminder['phone_number'], message)
-                    mark_reminder_as_sent(reminder['id'])
-                    print(f"Successfully sent reminder {reminder['id']} to {reminder['phone_number']}")
-                except Exception as e:
-                    print(f"Error processing reminder {reminder['id']}: {e}")
-
-            print(f"Scheduler sleeping for {SLEEP_INTERVAL} seconds...")
-            time.sleep(SLEEP_INTERVAL)
+            deadline_str = reminder['event_deadline_utc']
+            deadline_utc = datetime.fromisoformat(deadline_str.replace('Z', '+00:00'))
+
+            ist_tz = ZoneInfo("Asia/Kolkata")
+            deadline_ist = deadline_utc.astimezone(ist_tz)
+            deadline_ist_str = deadline_ist.strftime('%Y-%m-%d %H:%M')
 
+            message = (
+                f"🔔 *REMINDER* 🔔\n\n"
+                f"This is a 1-hour reminder for your event:\n\n"
+                f"*{reminder['event_title']}*\n\n"
+                f"It's due at *{deadline_ist_str}* (IST)."
+            )
+            await send_whatsapp_message_async(reminder['phone_number'], message)
+            await mark_reminder_as_sent_async(reminder['id'])
+            print(f"Successfully sent reminder {reminder['id']} to {reminder['phone_number']}")
         except Exception as e:
-            print(f"Major scheduler loop error: {e}")
-            time.sleep(SLEEP_INTERVAL)
+            print(f"Error processing reminder {reminder['id']}: {e}")
+
+async def run_scheduler_async():
+    print("Starting reminder scheduler...")
+    semaphore = asyncio.Semaphore(MAX_IN_FLIGHT)
+    try:
+        while True:
+            try:
+                now_utc = datetime.now(timezone.utc)
+                print(f"[{now_utc.isoformat()}] Checking for pending reminders...")
+                reminders = await get_pending_reminders_async(now_utc)
+
+                if not reminders:
+                    print("No reminders due right now.")
+                else:
+                    print(f"Found {len(reminders)} reminders to send!")
+                await asyncio.gather(*(send_reminder(reminder, semaphore) for reminder in reminders))
+
+                print(f"Scheduler sleeping for {SLEEP_INTERVAL} seconds...")
+                await asyncio.sleep(SLEEP_INTERVAL)
+
+            except Exception as e:
+                print(f"Major scheduler loop error: {e}")
+                await asyncio.sleep(SLEEP_INTERVAL)
+    finally:
+        await close_async_http_client()
+
+def run_scheduler():
+    asyncio.run(run_scheduler_async())
 
 if __name__ == "__main__":
-    run_scheduler()
\ No newline at end of file
+    run_scheduler()
@@ -1,5 +1,6 @@
 import os
-from supabase import create_client, Client
+import asyncio
+from supabase import create_client, acreate_client, Client, AsyncClient
 from gotrue.types import User
 from datetime import datetime
 
@@ -7,6 +8,27 @@ SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+_async_supabase_task = None
+_async_supabase_loop = None
+
+async def get_async_supabase() -> AsyncClient:
+    """
+    Returns the async Supabase client for the running event loop, creating it on first use.
+    The creation task is shared so concurrent first callers all get the same client.
+    """
+    global _async_supabase_task, _async_supabase_loop
+    loop = asyncio.get_running_loop()
+    if _async_supabase_task is None or _async_supabase_loop is not loop:
+        _async_supabase_task = loop.create_task(acreate_client(SUPABASE_URL, SUPABASE_KEY))
+        _async_supabase_loop = loop
+    task = _async_supabase_task
+    try:
+        return await asyncio.shield(task)
+    except Exception:
+        if _async_supabase_task is task:
+            _async_supabase_task = None
+        raise
+
 def sign_up_with_email(email, password):
     """Signs up a new user."""
     try:
@@ -37,6 +59,19 @@ def get_user_by_phone(phone_number: str):
         print(f"Error getting user by phone: {e}")
         return None
 
+async def get_user_by_phone_async(phone_number: str):
+    """Async version of get_user_by_phone."""
+    try:
+        cleaned_phone = "".join(filter(str.isdigit, phone_number))
+        client = await get_async_supabase()
+        response = await client.table("user_profiles").select("*").eq("phone_number", cleaned_phone).execute()
+        if response.data:
+            return response.data[0]
+        return None
+    except Exception as e:
+        print(f"Error getting user by phone: {e}")
+        return None
+
 def get_profile_by_user_id(user_id: str):
     """Finds a user profile by their auth ID for the website."""
     try:
@@ -107,6 +142,22 @@ def add_scheduled_event(user_id: str, phone_number: str, title: str, deadline_ut
         print(f"Error adding scheduled event: {e}")
         return None
 
+async def add_scheduled_event_async(user_id: str, phone_number: str, title: str, deadline_utc: datetime, reminder_time_utc: datetime):
+    """Async version of add_scheduled_event."""
+    try:
+        client = await get_async_supabase()
+        response = await client.table("scheduled_events").insert({
+            "user_id": user_id,
+            "phone_number": phone_number,
+            "event_title": title,
+            "event_deadline_utc": deadline_utc.isoformat(),
+            "reminder_time_utc": reminder_time_utc.isoformat()
+        }).execute()
+        return response
+    except Exception as e:
+        print(f"Error adding scheduled event: {e}")
+        return None
+
 def get_pending_reminders(now_utc: datetime):
     """Fetches all reminders that are due to be sent."""
     try:
@@ -116,6 +167,16 @@ def get_pending_reminders(now_utc: datetime):
         print(f"Error fetching pending reminders: {e}")
         return []
 
+async def get_pending_reminders_async(now_utc: datetime):
+    """Async version of get_pending_reminders."""
+    try:
+        client = await get_async_supabase()
+        response = await client.table("scheduled_events").select("*").eq("reminder_sent", False).lte("reminder_time_utc", now_utc.isoformat()).execute()
+        return response.data
+    except Exception as e:
+        print(f"Error fetching pending reminders: {e}")
+        return []
+
 def mark_reminder_as_sent(event_id: int):
     """Marks a reminder as sent so it doesn't send again."""
     try:
@@ -123,4 +184,14 @@ def mark_reminder_as_sent(event_id: int):
             "reminder_sent": True
         }).eq("id", event_id).execute()
     except Exception as e:
-        print(f"Error marking reminder as sent: {e}")
\ No newline at end of file
+        print(f"Error marking reminder as sent: {e}")
+
+async def mark_reminder_as_sent_async(event_id: int):
+    """Async version of mark_reminder_as_sent."""
+    try:
+        client = await get_async_supabase()
+        await client.table("scheduled_events").update({
+            "reminder_sent": True
+        }).eq("id", event_id).execute()
+    except Exception as e:
+        print(f"Error marking reminder as sent: {e}")
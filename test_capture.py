@@ -0,0 +1,45 @@
+from capture import pseudonymize_phone, sanitize_payload
+
+SALT = "test-salt"
+
+def make_payload(body, message_id="wamid.HBgMOTE5ODc2NTQzMjEwFQIAEhggQTE="):
+    return {"entry": [{"id": "1234567890", "changes": [{"value": {
+        "contacts": [{"profile": {"name": "Alice"}, "wa_id": "919876543210"}],
+        "messages": [{
+            "from": "919876543210",
+            "id": message_id,
+            "context": {"from": "919876543210", "id": message_id},
+            "text": {"body": body}
+        }]
+    }}]}]}
+
+def message(payload):
+    return payload["entry"][0]["changes"][0]["value"]["messages"][0]
+
+def test_dates_and_amounts_in_text_are_kept():
+    for body in [
+        "Submit report by 22-11-2025 5pm",
+        "exam on 12 12 2025",
+        "DSA assignment due 2025-11-22 17:00",
+        "pay 1,500 by 05/12/2025",
+    ]:
+        assert message(sanitize_payload(make_payload(body), SALT))["text"]["body"] == body
+
+def test_phone_numbers_in_text_are_pseudonymized():
+    sanitized = message(sanitize_payload(make_payload("call +91 98765 43210 or 919876543210 by friday"), SALT))
+    pseudonym = pseudonymize_phone("919876543210", SALT)
+    assert sanitized["text"]["body"] == f"call {pseudonym} or {pseudonym} by friday"
+    assert sanitized["from"] == pseudonym
+
+def test_message_ids_and_names_are_replaced():
+    sanitized = sanitize_payload(make_payload("hi"), SALT)
+    msg = message(sanitized)
+    assert msg["id"].startswith("wamid.")
+    assert "HBgMOTE5ODc2NTQzMjEw" not in msg["id"]
+    assert msg["context"]["id"] == msg["id"]
+    assert "919876543210" not in str(sanitized)
+    assert sanitized["entry"][0]["changes"][0]["value"]["contacts"][0]["profile"]["name"] == "redacted"
+
+def test_pseudonyms_depend_on_salt():
+    assert pseudonymize_phone("919876543210", SALT) == pseudonymize_phone("+91 98765-43210", SALT)
+    assert pseudonymize_phone("919876543210", SALT) != pseudonymize_phone("919876543210", "other-salt")